@@ -1,11 +1,15 @@
 #!/home/gvklok/jewelrybox_venv/bin/python3
 
+import asyncio
+import functools
 import logging
 import time
 import atexit
-from PIL import Image, ImageDraw, ImageFont
+import numpy as np
+from PIL import ImageFont
 import os
 import pwd  # For getting user home directory with sudo
+import threading
 from zoneinfo import ZoneInfo  # Using zoneinfo for Python 3.11+
 
 # Set up logging
@@ -37,20 +41,18 @@ def load_config():
         config_path = os.path.join(user_home, 'Desktop', '.env')
 
         if os.path.exists(config_path):
-            logging.info(f"Loading config from {config_path}")
+            logging.info("Loading config from %s", config_path)
             with open(config_path, 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line or line.startswith('#'):
-                        continue
-                    if '=' in line:
-                        key, value = line.split('=', 1)
-                        key = key.strip()
-                        value = value.strip().strip("'\"")
-                        if key == 'JEWELRYBOX_BOT_TOKEN':
-                            token = value
-                        elif key == 'JEWELRYBOX_CHAT_ID':
-                            chat_id = value
+                data = f.read()
+            values = {}
+            for raw in data.splitlines():
+                key, sep, value = raw.partition('=')
+                # Skips blank lines, comments and anything without a '='
+                if not sep or key.lstrip().startswith('#'):
+                    continue
+                values[key.strip()] = value.strip().strip("'\"")
+            token = values.get('JEWELRYBOX_BOT_TOKEN', token)
+            chat_id = values.get('JEWELRYBOX_CHAT_ID', chat_id)
 
     if not token:
         logging.error("Bot token not found. Set JEWELRYBOX_BOT_TOKEN env var or create ~/.jewelrybox_env")
@@ -62,7 +64,7 @@ def load_config():
     try:
         chat_id = int(chat_id)
     except ValueError:
-        logging.error(f"JEWELRYBOX_CHAT_ID must be an integer, got: {chat_id}")
+        logging.error("JEWELRYBOX_CHAT_ID must be an integer, got: %s", chat_id)
         exit(1)
 
     return token, chat_id
@@ -77,9 +79,9 @@ libdir = os.path.join(user_home, 'e-Paper', 'RaspberryPi_JetsonNano', 'python',
 if os.path.exists(libdir):
     import sys
     sys.path.append(libdir)
-    logging.info(f"Added {libdir} to Python path.")
+    logging.info("Added %s to Python path.", libdir)
 else:
-    logging.error(f"Waveshare e-Paper library directory not found at {libdir}")
+    logging.error("Waveshare e-Paper library directory not found at %s", libdir)
     exit(1)
 
 epd = None
@@ -87,31 +89,120 @@ try:
     from waveshare_epd import epd2in13b_V4  # Import the V4 B model driver
     logging.info("Successfully imported epd2in13b_V4.")
 except Exception as e:
-    logging.error(f"Error importing Waveshare EPD driver: {e}")
+    logging.error("Error importing Waveshare EPD driver: %s", e)
     exit(1)
 
 try:
     epd = epd2in13b_V4.EPD()
+except Exception as e:
+    logging.error("Error creating e-Paper display: %s", e)
+    exit(1)
+
+# Get display dimensions
+EPD_WIDTH = epd.width
+EPD_HEIGHT = epd.height
+logging.info("Display dimensions: %sx%s", EPD_WIDTH, EPD_HEIGHT)
+
+# Packed rows are padded to whole bytes
+_LINE_BYTES = (EPD_WIDTH + 7) // 8
+
+# The red plane is never drawn to and clearing shows an empty frame, so build
+# one all-white buffer (set bits are white) and reuse it for both planes
+_BLANK_BLACK_BUF = _BLANK_RED_BUF = b'\xff' * (_LINE_BYTES * EPD_HEIGHT)
+
+try:
     logging.info("Initializing e-Paper display...")
     epd.init()
-    epd.Clear()
+    epd.display(_BLANK_BLACK_BUF, _BLANK_RED_BUF)
     # Put display to sleep after initial clear to save power
     epd.sleep()
     logging.info("e-Paper display initialized, cleared, and put to sleep.")
 except Exception as e:
-    logging.error(f"Error initializing e-Paper display: {e}")
+    logging.error("Error initializing e-Paper display: %s", e)
     exit(1)
 
-# Get display dimensions
-EPD_WIDTH = epd.width
-EPD_HEIGHT = epd.height
-logging.info(f"Display dimensions: {EPD_WIDTH}x{EPD_HEIGHT}")
+# Reusable portrait-oriented canvas for the black plane. True is white, the
+# panel's own bit convention, and rows are padded to whole bytes, so packing
+# it yields the panel buffer directly.
+_BLACK_FB = np.ones((EPD_HEIGHT, _LINE_BYTES * 8), dtype=bool)
 
-# Load default font
+# Fonts are loaded lazily, so only the sizes actually used stay resident
 fontdir = os.path.join(user_home, 'e-Paper', 'RaspberryPi_JetsonNano', 'python', 'pic')
-font18 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 18)
-font24 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 24)
-logging.info("Default fonts loaded.")
+
+
+@functools.lru_cache(maxsize=4)
+def _font(size):
+    """Load Font.ttc at the given size, parsing the file only once per size."""
+    logging.info("Loading font at size %s.", size)
+    return ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), size)
+
+
+# --- Display power management ---
+# Waking the panel reloads its LUT, so keep it awake for a short idle window
+# after an update; a burst of messages then only pays for init() once.
+EPD_IDLE_TIMEOUT = 15  # Seconds without updates before the panel sleeps
+_is_sleeping = True
+_last_activity = 0.0
+_idle_task = None
+# The driver is not reentrant and handlers run concurrently in executor
+# threads, so every init/display/sleep sequence holds this lock
+_epd_lock = threading.Lock()
+
+
+def _wake_display():
+    """Initialize the display if it is asleep and record the activity."""
+    global _is_sleeping, _last_activity
+    if _is_sleeping:
+        epd.init()
+        _is_sleeping = False
+    _last_activity = time.monotonic()
+
+
+def _sleep_display():
+    """Put the display to sleep if it is awake."""
+    global _is_sleeping
+    if not _is_sleeping:
+        epd.sleep()
+        _is_sleeping = True
+        logging.info("Display put to sleep after idle timeout.")
+
+
+async def _run_epd(func, *args):
+    """Run a blocking display call in the default executor.
+
+    SPI transfers and refreshes take seconds; running them off the event loop
+    keeps Telegram polling responsive meanwhile.
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+def _sleep_if_idle():
+    """Put the display to sleep if it has been unused for EPD_IDLE_TIMEOUT."""
+    with _epd_lock:
+        if time.monotonic() - _last_activity < EPD_IDLE_TIMEOUT:
+            return False
+        try:
+            _sleep_display()
+        except Exception as e:
+            # Give up until the next update reschedules; retrying here would spin
+            logging.error("Error putting display to sleep: %s", e)
+        return True
+
+
+async def _idle_sleep():
+    # One task per burst of updates: keep waiting until the deadline stops
+    # moving instead of being cancelled and restarted on every update.
+    while True:
+        await asyncio.sleep(max(0.0, _last_activity + EPD_IDLE_TIMEOUT - time.monotonic()))
+        if await _run_epd(_sleep_if_idle):
+            return
+
+
+def _schedule_idle_sleep():
+    """Start the countdown that puts the display to sleep once updates stop."""
+    global _idle_task
+    if _idle_task is None or _idle_task.done():
+        _idle_task = asyncio.create_task(_idle_sleep())
 
 
 # --- Cleanup on exit ---
@@ -120,73 +211,185 @@ def cleanup():
     logging.info("Running cleanup...")
     try:
         if epd is not None:
+            # Don't leave the panel powered if we exit inside the idle window,
+            # but release the GPIO/SPI handles even if sleeping fails
+            try:
+                with _epd_lock:
+                    _sleep_display()
+            except Exception as e:
+                logging.error("Error putting display to sleep: %s", e)
             epd2in13b_V4.epdconfig.module_exit()
             logging.info("E-paper module cleaned up.")
     except Exception as e:
-        logging.error(f"Error during cleanup: {e}")
+        logging.error("Error during cleanup: %s", e)
 
 
 atexit.register(cleanup)
 
 
-def display_message(text, font_size=18):
-    try:
-        # Wake up the display
-        epd.init()
-
-        # Create images with swapped dimensions for horizontal layout
-        image_black = Image.new('1', (EPD_HEIGHT, EPD_WIDTH), 255)  # Swap width/height
-        image_red = Image.new('1', (EPD_HEIGHT, EPD_WIDTH), 255)    # Swap width/height
-        draw_black = ImageDraw.Draw(image_black)
-        draw_red = ImageDraw.Draw(image_red)
-
-        current_font = None
-        if font_size == 18:
-            current_font = font18
-        elif font_size == 24:
-            current_font = font24
-        else:  # Fallback
-            current_font = font18
-
-        # Now work with the new dimensions (EPD_HEIGHT is now our "width")
-        display_width = EPD_HEIGHT
-        display_height = EPD_WIDTH
-
-        # Wrap text based on the new horizontal width
-        lines = []
-        words = text.split(' ')
-        current_line = ""
-        for word in words:
-            test_line = (current_line + (" " if current_line else "") + word)
-            if current_font.getlength(test_line) <= display_width - 10:  # -10 for padding
-                current_line += ((" " if current_line else "") + word)
-            else:
-                lines.append(current_line)
-                current_line = word
-        if current_line:
-            lines.append(current_line)
-
-        y_offset = 5  # Start a bit from the top
-        line_height = font_size + 2  # Add spacing
-
-        for line in lines:
-            if y_offset + line_height > display_height - 5:
+# Memo of (font, character) -> pixel width for the wrapper's per-character
+# steps, so each glyph is only measured by FreeType once. Cleared when full
+# to bound memory on the Pi.
+_CHAR_W = {}
+_CHAR_W_MAX = 2048
+
+
+def _char_width(char, font):
+    """Return font.getlength(char), memoized per font."""
+    key = (id(font), char)
+    width = _CHAR_W.get(key)
+    if width is None:
+        if len(_CHAR_W) >= _CHAR_W_MAX:
+            _CHAR_W.clear()
+        width = _CHAR_W[key] = font.getlength(char)
+    return width
+
+
+def _wrap_text(text, font, max_width):
+    """Split text into lines no wider than max_width pixels.
+
+    Guesses each line's length from the average character width, measures
+    that slice once, then adjusts one character at a time and backs off to
+    the last space. This keeps getlength() calls roughly linear in the
+    message length instead of re-measuring the whole line for every word.
+    """
+    # Collapse runs of spaces, tabs and newlines so pasted multi-line text
+    # doesn't produce blank lines or measure whitespace glyphs
+    text = ' '.join(text.split())
+    lines = []
+    # Bind the bound method used for slice measurements to a local
+    getlen = font.getlength
+    avg = _char_width('a', font)
+    estimate = max(1, int(max_width // avg))
+    n = len(text)
+    i = 0
+    while i < n:
+        j = min(n, i + estimate)
+        width = getlen(text[i:j])
+        # Shrink if the estimate overshot
+        while j > i + 1 and width > max_width:
+            j -= 1
+            width -= _char_width(text[j], font)
+        # Extend while the next character still fits
+        while j < n:
+            char_width = _char_width(text[j], font)
+            if width + char_width > max_width:
                 break
-            draw_black.text((5, y_offset), line, font=current_font, fill=0)
-            y_offset += line_height
+            width += char_width
+            j += 1
+        # Break on a word boundary unless the word alone is too long
+        if j < n and text[j] != ' ':
+            space = text.rfind(' ', i, j)
+            if space > i:
+                j = space
+        lines.append(text[i:j])
+        # Skip the space we broke on
+        i = j + 1 if j < n and text[j] == ' ' else j
+    return lines
+
+
+def _draw_line(line, font, x, y):
+    """Rasterize one line of text into _BLACK_FB.
+
+    (x, y) is the line's drawing origin in landscape coordinates, as for
+    ImageDraw.text(); the glyph mask is rotated 90° clockwise and written
+    straight into the portrait canvas, so the full frame never needs rotating.
+    """
+    # A single layout pass gives both the 1-bit mask and where it sits
+    # relative to the origin (negative for glyphs like 'j' that overhang)
+    mask, (off_x, off_y) = font.getmask2(line, mode='1')
+    w, h = mask.size
+    if not w or not h:
+        return
+    ink = np.array(mask, dtype=bool).reshape(h, w)
 
-        # Rotate for horizontal display
-        image_black = image_black.rotate(270, expand=True)
-        image_red = image_red.rotate(270, expand=True)
+    # Clip to the landscape frame (EPD_HEIGHT wide, EPD_WIDTH tall)
+    left, top = x + off_x, y + off_y
+    x0, y0 = max(left, 0), max(top, 0)
+    x1, y1 = min(left + w, EPD_HEIGHT), min(top + h, EPD_WIDTH)
+    if x0 >= x1 or y0 >= y1:
+        return
+    ink = ink[y0 - top:y1 - top, x0 - left:x1 - left]
 
-        epd.display(epd.getbuffer(image_black), epd.getbuffer(image_red))
-        logging.info("Message sent to display.")
+    # Landscape column x maps to portrait row x, landscape row y to portrait
+    # column EPD_WIDTH - 1 - y
+    _BLACK_FB[x0:x1, EPD_WIDTH - y1:EPD_WIDTH - y0] &= ~np.rot90(ink, -1)
 
-        # Put display back to sleep to save power and reduce wear
-        epd.sleep()
-        logging.info("Display put to sleep after update.")
+
+@functools.lru_cache(maxsize=32)
+def _render_buffers(text, font_size):
+    """Render text into packed (black, red) display buffers.
+
+    Pure function of its arguments, so repeated messages are served from the
+    cache without touching Pillow or re-packing the buffers.
+    """
+    _BLACK_FB[:] = True
+
+    current_font = _font(font_size if font_size in (18, 24) else 18)  # Fallback to 18
+
+    # Now work with the new dimensions (EPD_HEIGHT is now our "width")
+    display_width = EPD_HEIGHT
+    display_height = EPD_WIDTH
+
+    # Wrap text based on the new horizontal width
+    max_w = display_width - 10  # -10 for padding
+    lines = _wrap_text(text, current_font, max_w)
+
+    y_offset = 5  # Start a bit from the top
+    line_height = font_size + 2  # Add spacing
+    last_y = display_height - 5 - line_height  # Lowest offset a line still fits at
+
+    for line in lines:
+        if y_offset > last_y:
+            break
+        _draw_line(line, current_font, 5, y_offset)
+        y_offset += line_height
+
+    # Pack to 1 bpp; the canvas is already white-is-set, so no inverted copy
+    return np.packbits(_BLACK_FB, axis=1, bitorder='big').tobytes(), _BLANK_RED_BUF
+
+
+def _push_buffers(buf_black, buf_red):
+    """Send packed buffers to the panel and trigger a refresh."""
+    epd.display(buf_black, buf_red)
+
+
+# Black plane currently on the panel (None if unknown). The panel is
+# bistable, so an identical frame needs no refresh at all.
+_last_black_buf = _BLANK_BLACK_BUF
+
+
+def display_message(text, font_size=18):
+    """Show text on the display. Returns False if it was already showing."""
+    global _last_black_buf
+    try:
+        # Held across render and refresh; rendering also reuses _BLACK_FB
+        with _epd_lock:
+            buf_black, buf_red = _render_buffers(text, font_size)
+            if buf_black == _last_black_buf:
+                logging.info("Display already shows this message, skipping refresh.")
+                return False
+
+            # Wake up the display (no-op if it is still awake from a recent update)
+            _wake_display()
+
+            _last_black_buf = None  # Unknown if the refresh fails part way
+            _push_buffers(buf_black, buf_red)
+            _last_black_buf = buf_black
+        logging.info("Message sent to display.")
     except Exception as e:
-        logging.error(f"Error displaying message: {e}")
+        logging.error("Error displaying message: %s", e)
+    return True
+
+
+def clear_display():
+    global _last_black_buf
+    with _epd_lock:
+        _wake_display()
+        _last_black_buf = None
+        # One full-frame transfer per plane instead of the driver's Clear()
+        _push_buffers(_BLANK_BLACK_BUF, _BLANK_RED_BUF)
+        _last_black_buf = _BLANK_BLACK_BUF
 
 
 # --- Telegram Bot Setup ---
@@ -196,57 +399,65 @@ from telegram.ext import Application, CommandHandler, MessageHandler, filters, C
 logging.info("Telegram bot modules imported.")
 
 
-async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    logging.info(f"Received /start command from {update.effective_user.id}")
-    # Check authorization first, before sending any welcome info
-    if update.effective_user.id != CHAT_ID:
-        logging.warning(f"Unauthorized user {update.effective_user.id} tried to use bot. Expected chat_id: {CHAT_ID}")
-        await update.message.reply_text('You are not authorized to control this bot.')
-        return
+# Users allowed to control the bot
+_AUTHORIZED = frozenset({CHAT_ID})
+
+
+def require_auth(handler):
+    """Ignore updates from users who aren't authorized.
 
+    Unauthorized updates are only logged; replying would spend outbound API
+    calls (and rate limit) on whoever is spamming the bot.
+    """
+    @functools.wraps(handler)
+    async def inner(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user_id = update.effective_user.id
+        if user_id not in _AUTHORIZED:
+            logging.warning("Unauthorized user %s tried to use %s. Expected chat_id: %s", user_id, handler.__name__, CHAT_ID)
+            return
+        return await handler(update, context)
+    return inner
+
+
+@require_auth
+async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    logging.info("Received /start command from %s", update.effective_user.id)
     await update.message.reply_text('Welcome to your Jewelry Box! Send me a message to display on the e-paper screen.')
 
 
+@require_auth
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     message_text = update.message.text
-    logging.info(f"Received message from {user_id}: '{message_text}'")
+    logging.info("Received message from %s: '%s'", user_id, message_text)
 
-    if user_id != CHAT_ID:
-        logging.warning(f"Unauthorized message from {user_id}. Expected chat_id: {CHAT_ID}")
-        await update.message.reply_text('You are not authorized to send messages to this display.')
+    if not await _run_epd(display_message, message_text, 24):
+        await update.message.reply_text('No change, that message is already on the display.')
         return
-
-    display_message(message_text, font_size=24)
+    _schedule_idle_sleep()
     await update.message.reply_text('Message sent to e-paper display!')
 
 
+@require_auth
 async def clear_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    logging.info(f"Received /clear command from {user_id}")
-    if user_id != CHAT_ID:
-        logging.warning(f"Unauthorized user {user_id} tried to clear display. Expected chat_id: {CHAT_ID}")
-        await update.message.reply_text('You are not authorized to clear this display.')
-        return
+    logging.info("Received /clear command from %s", user_id)
     try:
-        epd.init()
-        epd.Clear()
-        epd.sleep()
+        await _run_epd(clear_display)
         await update.message.reply_text('E-paper display cleared!')
         logging.info("E-paper display cleared by command.")
     except Exception as e:
-        logging.error(f"Error clearing display via command: {e}")
+        logging.error("Error clearing display via command: %s", e)
         await update.message.reply_text(f'Error clearing display: {e}')
+    finally:
+        # The panel may have been woken even if the clear failed
+        _schedule_idle_sleep()
 
 
+@require_auth
 async def shutdown_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    logging.info(f"Received /shutdown command from {user_id}")
-    if user_id != CHAT_ID:
-        logging.warning(f"Unauthorized user {user_id} tried to shutdown. Expected chat_id: {CHAT_ID}")
-        await update.message.reply_text('You are not authorized to shutdown the bot.')
-        return
-
+    logging.info("Received /shutdown command from %s", user_id)
     await update.message.reply_text('Shutting down bot. The display will remain as is. Restart the script on the Pi to resume.')
     logging.info("Bot shutting down gracefully.")
     await context.application.stop()
@@ -277,4 +488,4 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         logging.info("Exiting script due to KeyboardInterrupt.")
     except Exception as e:
-        logging.critical(f"An unhandled error occurred: {e}", exc_info=True)
\ No newline at end of file
+        logging.critical("An unhandled error occurred: %s", e, exc_info=True)
\ No newline at end of file